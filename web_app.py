@@ -1,14 +1,38 @@
-﻿import csv
+﻿import atexit
+import cProfile
+import copy
+import csv
+import hmac
 import json
 import os
+import pstats
 import re
-from datetime import datetime, timezone
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from functools import lru_cache
 from io import StringIO
 from pathlib import Path
 from urllib.error import URLError
+from urllib.parse import urlencode
 from urllib.request import ProxyHandler, Request, build_opener, urlopen
 
-from flask import Flask, redirect, render_template_string, request, url_for
+from flask import (
+    Flask,
+    Response,
+    abort,
+    g,
+    redirect,
+    render_template_string,
+    request,
+    url_for,
+)
 
 from todo import add_item, load_items, remove_item, toggle_done
 
@@ -19,6 +43,35 @@ STOCKS_PATH = BASE_DIR / "stocks.json"
 STARTUP_REFRESH_DONE = False
 
 
+def _env_float(key, default):
+    try:
+        return float(os.environ.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Hedged fetching: when the primary provider is slower than this percentile
+# of its recent latency, the next provider is started in parallel.
+HEDGE_PERCENTILE = min(max(_env_float("STOCK_HEDGE_PERCENTILE", 0.9), 0.5), 0.99)
+# Upper bound on the fraction of fetches that may fire a hedge request.
+HEDGE_BUDGET = min(max(_env_float("STOCK_HEDGE_BUDGET", 0.2), 0.0), 1.0)
+HEDGE_MIN_DELAY = 0.2
+HEDGE_DEFAULT_DELAY = 1.5
+LATENCY_WINDOW = 50
+LATENCY_MIN_SAMPLES = 5
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# stocks.json is written behind: saves within this window are coalesced.
+WRITE_BEHIND_DELAY = max(_env_float("STOCK_WRITE_DELAY", 0.5), 0.0)
+WRITE_RETRY_DELAY = 5.0
+# Admin-only profiling. Requests at or above the threshold keep a sampled
+# stack profile; the last SLOW_REQUEST_KEEP are listed at /admin/slow.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+PROFILE_DIR = BASE_DIR / "profiles"
+SLOW_REQUEST_THRESHOLD = max(_env_float("SLOW_REQUEST_THRESHOLD", 1.0), 0.0)
+SLOW_REQUEST_KEEP = 20
+STACK_SAMPLE_INTERVAL = 0.01
+
+
 def _clear_broken_proxy_env():
     keys = [
         "HTTP_PROXY",
@@ -286,25 +339,29 @@ PAGE = """
   <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"></script>
   <script>
     const series = {{ stock_series | tojson }};
-    const labels = series.length ? series[0].prices.map(p => p.date) : [];
+    const labels = {{ dates | tojson }};
     const colors = ["#1f6feb", "#d12f2f", "#0f9d58", "#ff9800"];
 
     const datasets = series.map((s, i) => {
-      const base = s.prices.length ? Number(s.prices[0].close) : 1;
-      const normalized = s.prices.map(p => {
-        const close = Number(p.close);
-        if (!base || Number.isNaN(close)) return null;
-        return Number((close / base).toFixed(4));
+      // Each series is an offset into the shared date index plus a dense
+      // close array; missing days are null.
+      const closes = new Array(s.offset).fill(null).concat(s.closes);
+      const first = s.closes.find(c => c != null);
+      const base = first == null ? 1 : Number(first);
+      const normalized = closes.map(c => {
+        if (c == null || !base) return null;
+        return Number((Number(c) / base).toFixed(4));
       });
       return {
         label: `${s.symbol} (${s.source})`,
         data: normalized,
-        actualPrices: s.prices.map(p => Number(p.close)),
+        actualPrices: closes.map(c => (c == null ? null : Number(c))),
         borderColor: colors[i % colors.length],
         backgroundColor: colors[i % colors.length],
         borderWidth: 2,
         tension: 0.25,
         pointRadius: 3,
+        spanGaps: true,
         fill: false
       };
     });
@@ -351,6 +408,52 @@ PAGE = """
 """
 
 
+SLOW_PAGE = """
+<!doctype html>
+<html lang="ko">
+<head>
+  <meta charset="utf-8">
+  <title>Slow requests</title>
+  <style>
+    body { margin: 24px; font-family: "Segoe UI", "Noto Sans KR", sans-serif; color: #192230; }
+    table { border-collapse: collapse; width: 100%; }
+    th, td { border-bottom: 1px solid #d9dfeb; padding: 6px 8px; text-align: left; font-size: 14px; vertical-align: top; }
+    pre { margin: 6px 0 0; font-size: 12px; white-space: pre-wrap; }
+    .muted { color: #6b7585; }
+  </style>
+</head>
+<body>
+  <h1>Slow requests</h1>
+  <p class="muted">Threshold {{ threshold_ms }} ms, keeping the last {{ keep }}.</p>
+  {% if captures %}
+  <table>
+    <tr><th>Started (UTC)</th><th>Request</th><th>Total</th><th>Breakdown</th><th>Stacks</th></tr>
+    {% for c in captures %}
+    <tr>
+      <td>{{ c.started_at }}</td>
+      <td>{{ c.method }} {{ c.path }}</td>
+      <td>{{ c.duration_ms }} ms</td>
+      <td>
+        {% for phase, ms in c.timings.items() %}{{ phase }}: {{ ms }} ms<br>{% endfor %}
+      </td>
+      <td>
+        <details>
+          <summary>{{ c.samples }} samples</summary>
+          <pre>{% for stack, count in c.stacks %}{{ count }}  {{ stack }}
+{% endfor %}</pre>
+        </details>
+      </td>
+    </tr>
+    {% endfor %}
+  </table>
+  {% else %}
+  <p class="muted">No slow requests captured.</p>
+  {% endif %}
+</body>
+</html>
+"""
+
+
 def _normalize_days(raw_days, default=7):
     try:
         days = int(raw_days)
@@ -359,17 +462,111 @@ def _normalize_days(raw_days, default=7):
     return max(2, min(days, 180))
 
 
-def load_stock_config():
+def _timestamps_to_ordinals(timestamps):
+    # Daily bars are stamped within the UTC trading day, so integer division
+    # gives the same date as datetime.fromtimestamp(..., tz=utc) without
+    # building a datetime per point.
+    return [_EPOCH_ORDINAL + int(ts) // 86400 for ts in timestamps]
+
+
+@lru_cache(maxsize=4096)
+def _iso_to_ordinal(text):
+    return date.fromisoformat(text).toordinal()
+
+
+@lru_cache(maxsize=4096)
+def _ordinal_to_iso(ordinal):
+    return date.fromordinal(ordinal).isoformat()
+
+
+def align_series(raw_series, days=None):
+    """Align fetched series onto one shared trading-day index.
+
+    ``raw_series`` items carry parallel ``ordinals``/``closes`` lists. The
+    index is the sorted union of every series' day ordinals (trimmed to the
+    last ``days`` entries). Each aligned series is stored as an ``offset``
+    into that index plus a dense ``closes`` list where missing days are
+    ``None``.
+    """
+    day_index = sorted({d for s in raw_series for d in s.get("ordinals", [])})
+    if days:
+        day_index = day_index[-days:]
+    positions = {day: i for i, day in enumerate(day_index)}
+
+    aligned = []
+    for s in raw_series:
+        closes = [None] * len(day_index)
+        for day, close in zip(s.get("ordinals", []), s.get("closes", [])):
+            i = positions.get(day)
+            if i is not None:
+                closes[i] = close
+        offset = next(
+            (i for i, close in enumerate(closes) if close is not None),
+            len(closes),
+        )
+        aligned.append(
+            {
+                "symbol": s.get("symbol"),
+                "source": s.get("source", ""),
+                "offset": offset,
+                "closes": closes[offset:],
+            }
+        )
+    return day_index, aligned
+
+
+def _series_from_legacy(series):
+    # Older stocks.json files stored per-symbol {"date", "close"} lists.
+    raw = []
+    for s in series:
+        if not isinstance(s, dict):
+            continue
+        ordinals = []
+        closes = []
+        for point in s.get("prices") or []:
+            try:
+                ordinal = _iso_to_ordinal(point["date"])
+                close = float(point["close"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            ordinals.append(ordinal)
+            closes.append(close)
+        raw.append(
+            {
+                "symbol": s.get("symbol"),
+                "source": s.get("source", ""),
+                "ordinals": ordinals,
+                "closes": closes,
+            }
+        )
+    return align_series(raw)
+
+
+def _valid_aligned(day_index, series):
+    if not all(isinstance(d, int) for d in day_index):
+        return False
+    for s in series:
+        if not isinstance(s, dict) or not isinstance(s.get("closes"), list):
+            return False
+        offset = s.get("offset")
+        if not isinstance(offset, int) or offset < 0:
+            return False
+        if offset + len(s["closes"]) > len(day_index):
+            return False
+    return True
+
+
+def _parse_stock_config(raw_text):
     default_config = {
         "symbols": [],
         "refresh_days": 7,
         "updated_at": "",
+        "day_index": [],
         "series": [],
     }
-    if not STOCKS_PATH.exists():
+    if raw_text is None:
         return default_config
 
-    raw_text = STOCKS_PATH.read_text(encoding="utf-8")
     try:
         data = json.loads(raw_text)
     except json.JSONDecodeError:
@@ -383,11 +580,13 @@ def load_stock_config():
         symbols = data
         refresh_days = 7
         updated_at = ""
+        day_index = []
         series = []
     elif isinstance(data, dict):
         symbols = data.get("symbols", [])
         refresh_days = _normalize_days(data.get("refresh_days", 7), 7)
         updated_at = data.get("updated_at", "")
+        day_index = data.get("day_index", [])
         series = data.get("series", [])
     else:
         return default_config
@@ -400,27 +599,204 @@ def load_stock_config():
                 clean.append(s)
     if not isinstance(series, list):
         series = []
+    if not isinstance(day_index, list):
+        day_index = []
+    if any(isinstance(s, dict) and "prices" in s for s in series):
+        day_index, series = _series_from_legacy(series)
+    elif not _valid_aligned(day_index, series):
+        day_index, series = [], []
     if not isinstance(updated_at, str):
         updated_at = ""
     return {
         "symbols": clean,
         "refresh_days": refresh_days,
         "updated_at": updated_at,
+        "day_index": day_index,
         "series": series,
     }
 
 
-def save_stock_config(config):
+_STOCK_LOCK = threading.RLock()
+_STOCK_CACHE = {
+    "config": None,
+    "mtime": None,
+    "written": None,
+    # Per-key JSON fragments of the text last written; only dirty keys are
+    # re-encoded on flush.
+    "parts": {},
+    "dirty": set(),
+    "timer": None,
+    "deadline": 0.0,
+}
+
+
+def _stocks_mtime():
+    try:
+        return STOCKS_PATH.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _atomic_write_text(path, text):
+    # mkstemp creates the file 0600 and os.replace keeps that mode, so carry
+    # the existing file's permissions over.
+    try:
+        mode = path.stat().st_mode & 0o777
+    except OSError:
+        mode = 0o644
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        os.chmod(tmp_name, mode)
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(text)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def load_stock_config():
+    with _STOCK_LOCK:
+        cached = _STOCK_CACHE["config"]
+        if cached is not None and (
+            _STOCK_CACHE["dirty"] or _stocks_mtime() == _STOCK_CACHE["mtime"]
+        ):
+            return copy.deepcopy(cached)
+
+        mtime = _stocks_mtime()
+        raw_text = None
+        if mtime is not None:
+            raw_text = STOCKS_PATH.read_text(encoding="utf-8")
+        config = _parse_stock_config(raw_text)
+        _STOCK_CACHE["config"] = config
+        _STOCK_CACHE["mtime"] = mtime
+        _STOCK_CACHE["written"] = raw_text
+        _STOCK_CACHE["parts"] = {}
+        return copy.deepcopy(config)
+
+
+def save_stock_config(config, delay=None):
+    """Record config changes and schedule a coalesced write of stocks.json.
+
+    Only keys that differ from the cached copy are marked dirty; a save that
+    changes nothing schedules no new write. ``delay`` defaults to
+    WRITE_BEHIND_DELAY; a later save with a shorter delay pulls a pending
+    flush forward.
+    """
+    if delay is None:
+        delay = WRITE_BEHIND_DELAY
     payload = {
         "symbols": config.get("symbols", []),
         "refresh_days": _normalize_days(config.get("refresh_days", 7), 7),
         "updated_at": config.get("updated_at", ""),
+        "day_index": config.get("day_index", []),
         "series": config.get("series", []),
     }
-    STOCKS_PATH.write_text(
-        json.dumps(payload, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    with _STOCK_LOCK:
+        cached = _STOCK_CACHE["config"] or {}
+        changed = {key for key, value in payload.items() if cached.get(key) != value}
+        if changed:
+            _STOCK_CACHE["config"] = copy.deepcopy(payload)
+            _STOCK_CACHE["dirty"] |= changed
+        if not _STOCK_CACHE["dirty"]:
+            return
+        if delay <= 0:
+            flush_stock_config()
+        else:
+            _schedule_flush(delay)
+
+
+def _schedule_flush(delay):
+    with _STOCK_LOCK:
+        deadline = time.monotonic() + delay
+        timer = _STOCK_CACHE["timer"]
+        if timer is not None:
+            if _STOCK_CACHE["deadline"] <= deadline:
+                return
+            timer.cancel()
+        timer = threading.Timer(delay, flush_stock_config)
+        timer.daemon = True
+        _STOCK_CACHE["timer"] = timer
+        _STOCK_CACHE["deadline"] = deadline
+        timer.start()
+
+
+def _join_config_parts(parts):
+    # Same layout as json.dumps(config, indent=2): nest each fragment one
+    # level deeper.
+    if not parts:
+        return "{}"
+    lines = [
+        f"  {json.dumps(key, ensure_ascii=False)}: " + encoded.replace("\n", "\n  ")
+        for key, encoded in parts.items()
+    ]
+    return "{\n" + ",\n".join(lines) + "\n}"
+
+
+def flush_stock_config():
+    """Write pending config changes to stocks.json atomically.
+
+    Returns True if the file was rewritten, False if there was nothing to
+    write or the serialized content is identical to what is on disk.
+    """
+    with _STOCK_LOCK:
+        timer = _STOCK_CACHE["timer"]
+        if timer is not None:
+            timer.cancel()
+            _STOCK_CACHE["timer"] = None
+        dirty = _STOCK_CACHE["dirty"]
+        if not dirty:
+            return False
+        config = _STOCK_CACHE["config"]
+        parts = _STOCK_CACHE["parts"]
+        new_parts = {}
+        changed = False
+        for key, value in config.items():
+            if key in dirty or key not in parts:
+                new_parts[key] = json.dumps(value, ensure_ascii=False, indent=2)
+                changed = changed or new_parts[key] != parts.get(key)
+            else:
+                new_parts[key] = parts[key]
+        text = None
+        if changed:
+            text = _join_config_parts(new_parts)
+        if text is None or text == _STOCK_CACHE["written"]:
+            _STOCK_CACHE["dirty"] = set()
+            _STOCK_CACHE["parts"] = new_parts
+            return False
+        try:
+            _atomic_write_text(STOCKS_PATH, text)
+        except OSError:
+            # Keep the changes dirty so the cache is not mistaken for what is
+            # on disk, and try again later.
+            app.logger.exception("Failed to write %s", STOCKS_PATH)
+            _schedule_flush(WRITE_RETRY_DELAY)
+            return False
+        _STOCK_CACHE["dirty"] = set()
+        _STOCK_CACHE["parts"] = new_parts
+        _STOCK_CACHE["written"] = text
+        _STOCK_CACHE["mtime"] = _stocks_mtime()
+        return True
+
+
+def _flush_on_sigterm(signum, frame):
+    # atexit handlers do not run on SIGTERM, which is how process managers
+    # stop the app; flush first, then exit normally.
+    flush_stock_config()
+    raise SystemExit(128 + signum)
+
+
+atexit.register(flush_stock_config)
+if (
+    threading.current_thread() is threading.main_thread()
+    and signal.getsignal(signal.SIGTERM) is signal.SIG_DFL
+):
+    signal.signal(signal.SIGTERM, _flush_on_sigterm)
 
 
 def _http_get_text(url):
@@ -470,17 +846,23 @@ def fetch_from_yahoo(symbol, days):
     except (KeyError, IndexError, TypeError, ValueError, URLError):
         return None
 
+    ordinals = []
     points = []
-    for ts, close in zip(timestamps, closes):
+    for day, close in zip(_timestamps_to_ordinals(timestamps), closes):
         if close is None:
             continue
-        day = datetime.fromtimestamp(ts, tz=timezone.utc).date().isoformat()
-        points.append({"date": day, "close": round(float(close), 2)})
+        ordinals.append(day)
+        points.append(round(float(close), 2))
 
     if len(points) < days:
         return None
 
-    return {"symbol": symbol, "source": "Yahoo", "prices": points[-days:]}
+    return {
+        "symbol": symbol,
+        "source": "Yahoo",
+        "ordinals": ordinals[-days:],
+        "closes": points[-days:],
+    }
 
 
 def fetch_from_stooq(symbol, days):
@@ -493,30 +875,307 @@ def fetch_from_stooq(symbol, days):
     except URLError:
         return None
 
-    points = []
+    rows = []
     for row in reader:
-        date = row.get("Date")
+        day = row.get("Date")
         close = row.get("Close")
-        if not date or not close or close == "0":
+        if not day or not close or close == "0":
             continue
         try:
-            points.append({"date": date, "close": round(float(close), 2)})
+            rows.append((day, round(float(close), 2)))
         except ValueError:
             continue
 
+    # The CSV is the full daily history; only convert the dates we keep.
+    ordinals = []
+    points = []
+    for day, value in rows[-days:]:
+        try:
+            ordinals.append(_iso_to_ordinal(day))
+        except ValueError:
+            continue
+        points.append(value)
+
     if len(points) < days:
         return None
 
-    return {"symbol": symbol, "source": "Stooq", "prices": points[-days:]}
+    return {
+        "symbol": symbol,
+        "source": "Stooq",
+        "ordinals": ordinals[-days:],
+        "closes": points[-days:],
+    }
+
+
+PROVIDERS = [
+    {"name": "Yahoo", "fetch": fetch_from_yahoo, "priority": 0},
+    {"name": "Stooq", "fetch": fetch_from_stooq, "priority": 1},
+]
+_FETCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="stock-fetch")
+_FETCH_LOCK = threading.Lock()
+_HEDGE_WINDOW = deque(maxlen=LATENCY_WINDOW)
+_PROVIDER_LATENCIES = {p["name"]: deque(maxlen=LATENCY_WINDOW) for p in PROVIDERS}
+FETCH_STATS = {
+    "requests": 0,
+    "hedged": 0,
+    "hedge_wins": 0,
+    "primary_wins": 0,
+    "fallbacks": 0,
+    "failures": 0,
+}
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _hedge_delay(provider_name):
+    with _FETCH_LOCK:
+        samples = list(_PROVIDER_LATENCIES.get(provider_name, ()))
+    if len(samples) < LATENCY_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return max(HEDGE_MIN_DELAY, _percentile(samples, HEDGE_PERCENTILE))
+
+
+def _reserve_hedge(slot):
+    # The budget applies to the last LATENCY_WINDOW fetches only, so a quiet
+    # period cannot bank hedge credit for a later provider slowdown.
+    with _FETCH_LOCK:
+        hedges = sum(1 for s in _HEDGE_WINDOW if s["hedged"])
+        if hedges + 1 > HEDGE_BUDGET * len(_HEDGE_WINDOW):
+            return False
+        slot["hedged"] = True
+        FETCH_STATS["hedged"] += 1
+        return True
+
+
+def _timed_fetch(provider, symbol, days, owner=None):
+    # ``owner`` is the ident of the request thread this fetch works for, so
+    # the slow-request sampler can attribute this worker's stacks to it.
+    worker = threading.get_ident()
+    worker_profiles = None
+    if owner is not None:
+        with _SAMPLER_LOCK:
+            _FETCH_WORKERS[worker] = (owner, provider["name"])
+            worker_profiles = _PROFILED_REQUESTS.get(owner)
+    try:
+        if worker_profiles is None:
+            return _run_fetch(provider, symbol, days)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return _run_fetch(provider, symbol, days)
+        finally:
+            profiler.disable()
+            worker_profiles.append(profiler)
+    finally:
+        if owner is not None:
+            with _SAMPLER_LOCK:
+                _FETCH_WORKERS.pop(worker, None)
+
+
+def _run_fetch(provider, symbol, days):
+    started = time.perf_counter()
+    try:
+        data = provider["fetch"](symbol, days)
+    except Exception:
+        # Hedged and fallback providers run alongside the primary; a failure
+        # in one of them must not abort the whole fetch.
+        app.logger.warning(
+            "%s fetch failed for %s", provider["name"], symbol, exc_info=True
+        )
+        data = None
+    if data is not None:
+        elapsed = time.perf_counter() - started
+        with _FETCH_LOCK:
+            _PROVIDER_LATENCIES.setdefault(
+                provider["name"], deque(maxlen=LATENCY_WINDOW)
+            ).append(elapsed)
+    return data
+
+
+def fetch_with_hedging(symbol, days):
+    """Fetch one symbol from the providers in priority order.
+
+    If the primary has not answered within its recent latency percentile
+    (and the hedge budget allows it), the next provider is started in
+    parallel and the first valid result wins. A provider that fails
+    outright falls through to the next one as before.
+    """
+    queue = sorted(PROVIDERS, key=lambda p: p["priority"])
+    if not queue:
+        return None
+    primary = queue[0]["name"]
+    slot = {"hedged": False}
+    with _FETCH_LOCK:
+        FETCH_STATS["requests"] += 1
+        _HEDGE_WINDOW.append(slot)
+
+    pending = {}
+    hedge_checked = False
+    hedged = False
+
+    def launch():
+        provider = queue.pop(0)
+        future = _FETCH_POOL.submit(
+            _timed_fetch, provider, symbol, days, threading.get_ident()
+        )
+        pending[future] = provider
+
+    launch()
+    while pending:
+        timeout = None
+        if queue and not hedge_checked:
+            timeout = _hedge_delay(primary)
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            hedge_checked = True
+            if _reserve_hedge(slot):
+                hedged = True
+                launch()
+            continue
+
+        for future in done:
+            provider = pending.pop(future)
+            data = future.result()
+            if data is None:
+                continue
+            # Requests already in flight cannot be interrupted; their
+            # results are simply discarded once they return.
+            for other in pending:
+                other.cancel()
+            with _FETCH_LOCK:
+                if provider["name"] == primary:
+                    FETCH_STATS["primary_wins"] += 1
+                elif hedged:
+                    FETCH_STATS["hedge_wins"] += 1
+                else:
+                    FETCH_STATS["fallbacks"] += 1
+            return data
+
+        hedge_checked = True
+        if not pending and queue:
+            launch()
+
+    with _FETCH_LOCK:
+        FETCH_STATS["failures"] += 1
+    return None
+
+
+def fetch_stats():
+    with _FETCH_LOCK:
+        stats = dict(FETCH_STATS)
+        latencies = {
+            name: {
+                "samples": len(samples),
+                "p50_ms": round(_percentile(samples, 0.5) * 1000, 1) if samples else None,
+                "p90_ms": round(_percentile(samples, 0.9) * 1000, 1) if samples else None,
+            }
+            for name, samples in _PROVIDER_LATENCIES.items()
+        }
+    hedged = stats["hedged"]
+    stats["hedge_win_rate"] = round(stats["hedge_wins"] / hedged, 3) if hedged else 0.0
+    stats["hedge_percentile"] = HEDGE_PERCENTILE
+    stats["hedge_budget"] = HEDGE_BUDGET
+    stats["providers"] = latencies
+    return stats
+
+
+_SAMPLER_LOCK = threading.Lock()
+_ACTIVE_REQUESTS = {}
+# Fetch pool thread ident -> (request thread ident, provider name).
+_FETCH_WORKERS = {}
+_SAMPLER = {"thread": None}
+# Set while any request is registered; the sampler sleeps on it otherwise.
+_SAMPLER_WAKE = threading.Event()
+SLOW_REQUESTS = deque(maxlen=SLOW_REQUEST_KEEP)
+# cProfile allows a single active profiler per process (Python 3.12+).
+_PROFILE_LOCK = threading.Lock()
+# Before 3.12 cProfile only sees the thread that enabled it, so fetch workers
+# of a profiled request run their own profiler, merged into the request's
+# output. From 3.12 the request's profiler is process-wide: it already covers
+# the workers, but also any other request running at the same time.
+_PER_THREAD_PROFILER = sys.version_info < (3, 12)
+# Profiled request thread ident -> profilers of its fetch workers.
+_PROFILED_REQUESTS = {}
+
+
+def _fold_stack(frame, limit=40):
+    parts = []
+    while frame is not None and len(parts) < limit:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def _sample_stacks():
+    while True:
+        _SAMPLER_WAKE.wait()
+        time.sleep(STACK_SAMPLE_INTERVAL)
+        with _SAMPLER_LOCK:
+            if not _ACTIVE_REQUESTS:
+                _SAMPLER_WAKE.clear()
+                continue
+            frames = sys._current_frames()
+            for ident, entry in _ACTIVE_REQUESTS.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    entry["stacks"][_fold_stack(frame)] += 1
+            for ident, (owner, provider_name) in _FETCH_WORKERS.items():
+                entry = _ACTIVE_REQUESTS.get(owner)
+                frame = frames.get(ident)
+                if entry is not None and frame is not None:
+                    stack = f"[{provider_name} fetch];{_fold_stack(frame)}"
+                    entry["stacks"][stack] += 1
+
+
+def _ensure_sampler():
+    with _SAMPLER_LOCK:
+        if _SAMPLER["thread"] is None:
+            thread = threading.Thread(
+                target=_sample_stacks, name="slow-request-sampler", daemon=True
+            )
+            _SAMPLER["thread"] = thread
+            thread.start()
+
+
+@contextmanager
+def _phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(g, "timings", None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def _is_admin():
+    if not ADMIN_TOKEN:
+        return False
+    # Header only: a query-string token would end up in access logs and
+    # browser history.
+    token = request.headers.get("X-Admin-Token", "")
+    return hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+def _profile_mode():
+    mode = request.headers.get("X-Profile") or request.args.get("profile", "")
+    if mode not in ("1", "save") or not _is_admin():
+        return ""
+    return mode
 
 
 def fetch_recent_prices(symbols, days):
     series = []
     failed = []
     for symbol in symbols:
-        data = fetch_from_yahoo(symbol, days)
-        if data is None:
-            data = fetch_from_stooq(symbol, days)
+        data = fetch_with_hedging(symbol, days)
         if data is None:
             failed.append(symbol)
             continue
@@ -524,11 +1183,129 @@ def fetch_recent_prices(symbols, days):
     return series, failed
 
 
+@app.before_request
+def _start_request_tracking():
+    g.request_started = time.perf_counter()
+    g.timings = {}
+    _ensure_sampler()
+    with _SAMPLER_LOCK:
+        _ACTIVE_REQUESTS[threading.get_ident()] = {"stacks": Counter()}
+        _SAMPLER_WAKE.set()
+    g.profile_mode = _profile_mode()
+    if not g.profile_mode:
+        return None
+    if not _PROFILE_LOCK.acquire(blocking=False):
+        return Response("Another profiled request is running.\n", 409, mimetype="text/plain")
+    g.profile_lock_held = True
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Some other profiling tool is already active in this process.
+        return Response("A profiler is already active.\n", 409, mimetype="text/plain")
+    g.profiler = profiler
+    if _PER_THREAD_PROFILER:
+        with _SAMPLER_LOCK:
+            _PROFILED_REQUESTS[threading.get_ident()] = []
+    return None
+
+
+@app.after_request
+def _finish_profile(response):
+    profiler = getattr(g, "profiler", None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    g.profiler = None
+    with _SAMPLER_LOCK:
+        worker_profiles = _PROFILED_REQUESTS.pop(threading.get_ident(), [])
+    out = StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    for worker_profile in worker_profiles:
+        stats.add(worker_profile)
+    if g.profile_mode == "save":
+        PROFILE_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+        path = PROFILE_DIR / f"{stamp}-{request.endpoint or 'unknown'}.prof"
+        stats.dump_stats(path)
+        response.headers["X-Profile-Saved"] = path.name
+        return response
+    stats.sort_stats("cumulative").print_stats(40)
+    return Response(out.getvalue(), mimetype="text/plain")
+
+
+@app.teardown_request
+def _release_profiler(exc):
+    # after_request is skipped when the view raises, so make sure the
+    # profiler is stopped and the lock released here.
+    try:
+        with _SAMPLER_LOCK:
+            _PROFILED_REQUESTS.pop(threading.get_ident(), None)
+        profiler = getattr(g, "profiler", None)
+        if profiler is not None:
+            g.profiler = None
+            profiler.disable()
+    finally:
+        if getattr(g, "profile_lock_held", False):
+            g.profile_lock_held = False
+            _PROFILE_LOCK.release()
+
+
+@app.teardown_request
+def _capture_slow_request(exc):
+    with _SAMPLER_LOCK:
+        entry = _ACTIVE_REQUESTS.pop(threading.get_ident(), None)
+    started = getattr(g, "request_started", None)
+    if entry is None or started is None:
+        return
+    duration = time.perf_counter() - started
+    if duration < SLOW_REQUEST_THRESHOLD:
+        return
+    stacks = entry["stacks"]
+    query = urlencode(
+        [(k, v) for k, v in request.args.items(multi=True) if k != "admin_token"]
+    )
+    capture = {
+        "started_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "method": request.method,
+        "path": f"{request.path}?{query}" if query else request.path,
+        "duration_ms": round(duration * 1000, 1),
+        "timings": {
+            phase: round(seconds * 1000, 1)
+            for phase, seconds in g.timings.items()
+        },
+        "samples": sum(stacks.values()),
+        "stacks": stacks.most_common(15),
+    }
+    with _SAMPLER_LOCK:
+        SLOW_REQUESTS.append(capture)
+
+
+def refresh_stock_series(config, days, delay=None):
+    """Fetch prices for the configured symbols into ``config`` and save it.
+
+    Returns the symbols that could not be fetched.
+    """
+    global STARTUP_REFRESH_DONE
+    with _phase("fetch"):
+        raw_series, failed = fetch_recent_prices(config.get("symbols", []), days)
+        if raw_series:
+            day_index, stock_series = align_series(raw_series, days)
+            config["day_index"] = day_index
+            config["series"] = stock_series
+            config["updated_at"] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M")
+    config["refresh_days"] = days
+    with _phase("save"):
+        save_stock_config(config, delay=delay)
+    STARTUP_REFRESH_DONE = True
+    return failed
+
+
 @app.get("/")
 def index():
-    global STARTUP_REFRESH_DONE
-    items = list(enumerate(load_items(), start=1))
-    config = load_stock_config()
+    with _phase("load"):
+        items = list(enumerate(load_items(), start=1))
+        config = load_stock_config()
     symbols = config["symbols"]
     requested_days = _normalize_days(
         request.args.get("days", config["refresh_days"]),
@@ -548,29 +1325,45 @@ def index():
 
     failed = []
     if should_refresh:
-        stock_series, failed = fetch_recent_prices(symbols, requested_days)
-        if stock_series:
-            config["series"] = stock_series
-            config["updated_at"] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M")
-        config["refresh_days"] = requested_days
-        save_stock_config(config)
-        STARTUP_REFRESH_DONE = True
-    else:
-        stock_series = config.get("series", [])
+        failed = refresh_stock_series(config, requested_days)
+
+    stock_series = config.get("series", [])
+    dates = [_ordinal_to_iso(day) for day in config.get("day_index", [])]
 
     days = config.get("refresh_days", 7)
     fetch_error = ""
     if failed:
         fetch_error = "Failed to fetch: " + ", ".join(failed)
+    with _phase("render"):
+        return render_template_string(
+            PAGE,
+            items=items,
+            stock_series=stock_series,
+            dates=dates,
+            updated_at=config.get("updated_at", ""),
+            symbols_text=", ".join(symbols) if symbols else "No symbols",
+            symbols=symbols,
+            days=days,
+            fetch_error=fetch_error,
+        )
+
+
+@app.get("/stocks/stats")
+def stock_stats():
+    return fetch_stats()
+
+
+@app.get("/admin/slow")
+def slow_requests():
+    if not _is_admin():
+        abort(404)
+    with _SAMPLER_LOCK:
+        captures = list(reversed(SLOW_REQUESTS))
     return render_template_string(
-        PAGE,
-        items=items,
-        stock_series=stock_series,
-        updated_at=config.get("updated_at", ""),
-        symbols_text=", ".join(symbols) if symbols else "No symbols",
-        symbols=symbols,
-        days=days,
-        fetch_error=fetch_error,
+        SLOW_PAGE,
+        captures=captures,
+        threshold_ms=round(SLOW_REQUEST_THRESHOLD * 1000),
+        keep=SLOW_REQUEST_KEEP,
     )
 
 
@@ -579,21 +1372,24 @@ def add():
     text = request.form.get("text", "").strip()
     days = _normalize_days(request.form.get("days", "7"), 7)
     if text:
-        add_item(text)
+        with _phase("save"):
+            add_item(text)
     return redirect(url_for("index", days=days))
 
 
 @app.post("/toggle/<int:index>")
 def toggle(index):
     days = _normalize_days(request.form.get("days", "7"), 7)
-    toggle_done(index)
+    with _phase("save"):
+        toggle_done(index)
     return redirect(url_for("index", days=days))
 
 
 @app.post("/delete/<int:index>")
 def delete(index):
     days = _normalize_days(request.form.get("days", "7"), 7)
-    remove_item(index)
+    with _phase("save"):
+        remove_item(index)
     return redirect(url_for("index", days=days))
 
 
@@ -604,24 +1400,28 @@ def add_stock():
     if not symbol or not re.fullmatch(r"[A-Z0-9.\-^]{1,12}", symbol):
         return redirect(url_for("index", days=days))
 
-    config = load_stock_config()
+    with _phase("load"):
+        config = load_stock_config()
     symbols = config.get("symbols", [])
     if symbol not in symbols:
         symbols.append(symbol)
         config["symbols"] = symbols
-        save_stock_config(config)
-    return redirect(url_for("index", days=days, refresh=1))
+    # Refresh here and write once, before redirecting, so the change is on
+    # disk whichever worker serves the next page.
+    refresh_stock_series(config, days, delay=0)
+    return redirect(url_for("index", days=days))
 
 
 @app.post("/stocks/delete/<symbol>")
 def delete_stock(symbol):
     days = _normalize_days(request.form.get("days", "7"), 7)
     target = (symbol or "").strip().upper()
-    config = load_stock_config()
+    with _phase("load"):
+        config = load_stock_config()
     symbols = [s for s in config.get("symbols", []) if s != target]
     config["symbols"] = symbols
-    save_stock_config(config)
-    return redirect(url_for("index", days=days, refresh=1))
+    refresh_stock_series(config, days, delay=0)
+    return redirect(url_for("index", days=days))
 
 
 if __name__ == "__main__":